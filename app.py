@@ -1,19 +1,38 @@
 import streamlit as st
+import os
+
+# Perkecil probe awal ffmpeg; harus di-set sebelum VideoCapture pertama dibuka
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "probesize;32|analyzeduration;0")
+
 import cv2
 import numpy as np
-from PIL import Image, ImageOps
-import os
+from PIL import Image
 import sys
 import io
 import tempfile 
+import shutil
+import threading
+import weakref
+import time
+import string
+import hashlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 try:
+    import torch
     from ultralytics import YOLO
     ULTRALYTICS_AVAILABLE = True
 except ImportError as e:
     ULTRALYTICS_AVAILABLE = False
     st.error(f"Ultralytics import error: {e}")
 
+# OpenCV tidak perlu thread pool sendiri agar tidak berebut core dengan Torch.
+# Di CPU, inferensi satu gambar lebih cepat tanpa overhead setup thread OpenMP.
+cv2.setNumThreads(0)
+if ULTRALYTICS_AVAILABLE and not torch.cuda.is_available():
+    torch.set_num_threads(1)
+
 st.set_page_config(
     page_title="Brain Tumor Detection & Visualization",
     page_icon="🧠",
@@ -21,51 +40,175 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .prediction-box {
-        padding: 1rem;
-        border-radius: 10px;
-        margin-top: 1rem;
-    }
-    .glioma { background-color: #ffebee; border-left: 5px solid #f44336; }
-    .meningioma { background-color: #e8f5e8; border-left: 5px solid #4caf50; }
-    .no-tumor { background-color: #e3f2fd; border-left: 5px solid #2196f3; }
-    .pituitary { background-color: #fff3e0; border-left: 5px solid #ff9800; }
-    .stButton>button {
-        width: 100%;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def load_css(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "style.css")):
+    """Membaca stylesheet aplikasi sekali per proses; aplikasi tetap berjalan tanpa style jika file tidak ada."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        st.sidebar.warning(f"File stylesheet tidak ditemukan: {path}")
+        return ""
+
+css = load_css()
+if css:
+    st.html(f"<style>{css}</style>")
+
+
+
+CLASS_NAMES = ['Glioma', 'Meningioma', 'No Tumor', 'Pituitary']
+# Ukuran input model, dan batas sisi terpanjang gambar sebelum diteruskan ke model
+MODEL_IMGSZ = 640
+MAX_INPUT_SIDE = 1280
 
+_STYLE = {'Glioma': 'glioma', 'Meningioma': 'meningioma', 'No Tumor': 'no-tumor', 'Pituitary': 'pituitary'}
+_CARD = string.Template("""
+                    <div class="prediction-box $style_class">
+                        <p><strong>Class:</strong> $class_name | <strong>Confidence:</strong> $confidence</p>
+                    </div>""")
 
+# Batas cadangan frame yang dilewati dengan grab() bila FPS video tidak diketahui
+DEFAULT_GRAB_AHEAD = 30
+
+
+def inference_options():
+    """Argumen tambahan untuk predict: FP16 di GPU CUDA, default FP32 di CPU."""
+    if ULTRALYTICS_AVAILABLE and torch.cuda.is_available():
+        return {'half': True, 'device': 0}
+    return {}
+
+def warmup_model(model_entry, imgsz=MODEL_IMGSZ):
+    """
+    Menjalankan satu inferensi dummy dengan ukuran input yang sama seperti inferensi asli
+    agar inisialisasi lazy (predictor, kernel CUDA) tidak terjadi saat klik pertama pengguna.
+    """
+    predict(model_entry, np.zeros((imgsz, imgsz, 3), dtype=np.uint8), conf=0.5)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
 
 @st.cache_resource
-def load_model(model_path):
-    """Memuat model YOLO dengan penanganan error."""
+def get_export_state():
+    """
+    Status export yang dibagi oleh semua sesi dan rerun: export yang sedang berjalan
+    dan error export per file model.
+    """
+    return {'lock': threading.Lock(), 'running': set(), 'errors': {}}
+
+def exported_model_path(model_path):
+    """
+    Path file hasil export untuk model .pt: TensorRT bila CUDA dan paket tensorrt tersedia,
+    ONNX di CPU. Mengembalikan None bila model tidak perlu diekspor.
+    """
+    root, ext = os.path.splitext(model_path)
+    if ext != '.pt':
+        return None
+    if torch.cuda.is_available():
+        # Tanpa tensorrt terpasang, Ultralytics akan mencoba pip install saat runtime
+        return root + '.engine' if importlib.util.find_spec('tensorrt') else None
+    return root + '.onnx'
+
+def resolve_model_path(model_path):
+    """Mengembalikan file model yang siap dipakai: hasil export yang lebih baru dari .pt, atau .pt itu sendiri."""
+    exported_path = exported_model_path(model_path)
+    if exported_path and exported_path not in get_export_state()['running'] and os.path.exists(exported_path) \
+            and os.path.getmtime(exported_path) >= os.path.getmtime(model_path):
+        return exported_path
+    return model_path
+
+def _export_worker(export_state, model_path, exported_path, imgsz):
+    """
+    Menjalankan export di thread latar belakang dan mencatat error bila gagal.
+    Export dilakukan di direktori temporer lalu dipindahkan dengan os.replace, sehingga
+    pembaca tidak pernah melihat file hasil export yang belum selesai ditulis.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(model_path)))
+    try:
+        tmp_weights = os.path.join(tmp_dir, os.path.basename(model_path))
+        shutil.copy2(model_path, tmp_weights)
+        # Sumbu batch dinamis agar semua gambar contoh bisa diinferensi dalam satu batch
+        if exported_path.endswith('.engine'):
+            result_path = YOLO(tmp_weights).export(format='engine', half=True, dynamic=True, batch=len(CLASS_NAMES),
+                                                   imgsz=imgsz, verbose=False)
+        else:
+            result_path = YOLO(tmp_weights).export(format='onnx', dynamic=True, imgsz=imgsz, verbose=False)
+        os.replace(result_path, exported_path)
+    except Exception as e:
+        export_state['errors'][model_path] = str(e)
+        print(f"Export model {model_path} gagal, tetap memakai .pt: {e}", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with export_state['lock']:
+            export_state['running'].discard(exported_path)
+
+def start_export(model_path, imgsz=MODEL_IMGSZ):
+    """
+    Memulai export model .pt ke format terkompilasi (TensorRT di GPU, ONNX di CPU) di thread
+    latar belakang, disimpan di samping file aslinya. Selama export berjalan .pt tetap dipakai;
+    model hasil export dimuat pada panggilan get_model berikutnya setelah selesai.
+    Export yang gagal tidak dicoba ulang sampai proses di-restart.
+    """
+    exported_path = exported_model_path(model_path)
+    if exported_path is None or resolve_model_path(model_path) == exported_path:
+        return
+    export_state = get_export_state()
+    with export_state['lock']:
+        if exported_path in export_state['running'] or model_path in export_state['errors']:
+            return
+        export_state['running'].add(exported_path)
+    threading.Thread(target=_export_worker, args=(export_state, model_path, exported_path, imgsz),
+                     daemon=True).start()
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_model(load_path, mtime):
+    """
+    Memuat model YOLO sekali per file (path dan mtime) dan membaginya ke semua sesi.
+    Model di-fuse dan di-warmup agar inferensi pertama tidak menanggung biaya inisialisasi.
+    Mengembalikan dict berisi model dan lock inferensinya, karena predictor Ultralytics
+    tidak thread-safe sedangkan model yang sama dipakai oleh worker dari banyak sesi.
+    """
+    model = YOLO(load_path, task='detect')
+    if load_path.endswith('.pt'):
+        model.fuse()
+    model_entry = {'model': model, 'lock': threading.Lock()}
+    warmup_model(model_entry)
+    return model_entry
+
+def get_model(model_path):
+    """
+    Mendapatkan model YOLO bersama dengan penanganan error. Model juga disimpan di session state
+    sehingga rerun berikutnya tidak perlu melewati lookup cache.
+    Kunci cache adalah path dan mtime file yang benar-benar dimuat (.pt atau hasil export).
+    """
     try:
         if not ULTRALYTICS_AVAILABLE:
             raise ImportError("Library 'ultralytics' tidak tersedia.")
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"File model tidak ditemukan: {model_path}")
-        model = YOLO(model_path)
-        return model, None
+        load_path = resolve_model_path(model_path)
+        model_key = (load_path, os.path.getmtime(load_path))
+        cached = st.session_state.get('_yolo_model')
+        if cached is not None and st.session_state.get('_yolo_model_key') == model_key:
+            return cached, None
+        model_entry = load_model(*model_key)
+        start_export(model_path)
+        st.session_state['_yolo_model'] = model_entry
+        st.session_state['_yolo_model_key'] = model_key
+        return model_entry, None
     except Exception as e:
         return None, str(e)
 
+@st.cache_resource
 def load_example_images():
-    """Memuat gambar contoh dari file lokal."""
+    """
+    Memuat gambar contoh dari file lokal beserta thumbnail untuk galeri.
+    Hasilnya di-cache sehingga decode dan resize hanya dilakukan sekali.
+    """
     example_images = {}
     image_files = {"Glioma": "glioma.jpg", "Meningioma": "meningioma.jpg", "Pituitary": "pituitary.jpg", "No Tumor": "no tumor.jpg"}
     for name, filename in image_files.items():
         if os.path.exists(filename):
-            example_images[name] = Image.open(filename)
+            image = Image.open(filename)
+            example_images[name] = {'full': image, 'thumb': resize_for_display(image, (256, 256))}
         else:
             st.sidebar.warning(f"File contoh tidak ditemukan: {filename}")
     return example_images
@@ -75,56 +218,207 @@ def resize_for_display(image, size=(256, 256)):
     Mengubah ukuran gambar agar seragam untuk ditampilkan di galeri.
     Menjaga aspek rasio dan menambahkan padding hitam.
     """
-    return ImageOps.pad(image, size, color='black')
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    arr = np.asarray(image)
+    h, w = arr.shape[:2]
+    scale = min(size[0] / w, size[1] / h)
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    arr = cv2.resize(arr, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    pad_w, pad_h = size[0] - new_w, size[1] - new_h
+    arr = cv2.copyMakeBorder(arr, pad_h // 2, pad_h - pad_h // 2, pad_w // 2, pad_w - pad_w // 2,
+                             cv2.BORDER_CONSTANT, value=0)
+    return Image.fromarray(arr)
+
+def _close_video(cap, video_path):
+    """Menutup VideoCapture lalu menghapus file temporernya (file harus ditutup dulu agar bisa dihapus di Windows)."""
+    cap.release()
+    try:
+        os.unlink(video_path)
+    except FileNotFoundError:
+        pass
+
+class VideoResource:
+    """
+    Pemegang VideoCapture dan file temporer milik satu sesi. Resource ditutup lewat close(),
+    atau otomatis oleh weakref.finalize saat session state di-GC (sesi berakhir) maupun saat proses berhenti.
+    """
+    def __init__(self, cap, video_path):
+        self.cap = cap
+        self.video_path = video_path
+        self._finalizer = weakref.finalize(self, _close_video, cap, video_path)
+
+    def close(self):
+        self._finalizer()
 
-def extract_frame_from_video(video_file, frame_number):
+def release_video():
+    """Menutup VideoCapture dan menghapus file temporer video dari session state."""
+    video = st.session_state.pop('video_resource', None)
+    if video is not None:
+        video.close()
+    for key in ['video_file_id', 'video_pos', 'video_last_frame']:
+        st.session_state.pop(key, None)
+
+def open_video(video_file):
     """
-    Mengekstrak frame dari file video dengan menyimpannya ke file temporer.
+    Menyimpan video yang diunggah ke file temporer sekali saja dan membuka VideoCapture.
+    Hasilnya disimpan di session state berdasarkan file_id sehingga tidak dibuka ulang setiap rerun,
+    dan dibersihkan saat video diganti, uploader dikosongkan, atau sesi berakhir.
     video_file adalah objek UploadedFile dari Streamlit.
     """
+    if st.session_state.get('video_file_id') == video_file.file_id:
+        return st.session_state.video_resource.cap, None
+
+    release_video()
     video_path = ""
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp:
-            # Tulis byte dari video yang diunggah ke file temporer
-            tmp.write(video_file.getvalue())
+            # getbuffer() memberikan memoryview tanpa menyalin byte video
+            tmp.write(video_file.getbuffer())
             video_path = tmp.name
-            
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            os.unlink(video_path) # Hapus file temporer jika gagal dibuka
-            return None, 0, "Gagal membuka file video."
 
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        if total_frames == 0:
-            cap.release()
-            os.unlink(video_path)
-            return None, 0, "Video tidak memiliki frame."
-
-        cap.set(cv2.CAP_PROP_POS_FRAMES, min(frame_number, total_frames - 1))
-        ret, frame = cap.read()
-        cap.release()
-        
-        os.unlink(video_path)
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+        if not cap.isOpened():
+            _close_video(cap, video_path) # Hapus file temporer jika gagal dibuka
+            return None, "Gagal membuka file video."
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
-        if ret:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(frame_rgb), total_frames, None
-        else:
-            return None, total_frames, "Gagal mengekstrak frame yang dipilih."
+        st.session_state.video_resource = VideoResource(cap, video_path)
+        st.session_state.video_file_id = video_file.file_id
+        return cap, None
 
     except Exception as e:
         # Jika terjadi error, pastikan file temporer tetap dihapus jika ada
         if video_path and os.path.exists(video_path):
             os.unlink(video_path)
-        return None, 0, f"Error saat memproses video: {str(e)}"
+        return None, f"Error saat memproses video: {str(e)}"
+
+def get_total_frames(cap):
+    """Mendapatkan jumlah frame dari VideoCapture yang sudah terbuka."""
+    return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+def get_frame(cap, frame_number):
+    """
+    Mengekstrak satu frame (array BGR) dari VideoCapture yang sudah terbuka.
+    Posisi stream disimpan di session state. Untuk seek maju yang dekat, frame dilewati dengan grab();
+    grab() tetap men-decode setiap frame, hanya konversi warna di retrieve() yang dilewati.
+    Karena itu lompatan lebih dari kira-kira satu GOP (didekati dengan FPS video, sekitar satu detik)
+    memakai cap.set(), yang cukup men-decode dari keyframe terdekat; begitu pula seek mundur.
+    """
+    frame_number = min(frame_number, get_total_frames(cap) - 1)
+    max_grab_ahead = int(cap.get(cv2.CAP_PROP_FPS)) or DEFAULT_GRAB_AHEAD
+    last_frame = st.session_state.get('video_last_frame')
+    if last_frame is not None and last_frame[0] == frame_number:
+        return last_frame[1], None
+
+    current_pos = st.session_state.get('video_pos', 0)
+    if frame_number < current_pos or frame_number - current_pos > max_grab_ahead:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        current_pos = frame_number
+
+    ret = True
+    for _ in range(frame_number - current_pos + 1):
+        ret = cap.grab()
+        if not ret:
+            break
+    if ret:
+        ret, frame = cap.retrieve()
+    if not ret:
+        # Posisi stream tidak diketahui, paksa seek ulang pada panggilan berikutnya
+        st.session_state.video_pos = get_total_frames(cap)
+        st.session_state.pop('video_last_frame', None)
+        return None, "Gagal mengekstrak frame yang dipilih."
+
+    st.session_state.video_pos = frame_number + 1
+    st.session_state.video_last_frame = (frame_number, frame)
+    return frame, None
+
+def predict(model_entry, source, conf):
+    """Menjalankan model di bawah lock miliknya (thread-safe) tanpa pencatatan autograd."""
+    with model_entry['lock'], torch.inference_mode():
+        return model_entry['model'](source, conf=conf, imgsz=MODEL_IMGSZ, verbose=False, **inference_options())
+
+def bound_image(image, max_side=MAX_INPUT_SIDE):
+    """Memperkecil array gambar yang sisi terpanjangnya melebihi max_side, dengan aspek rasio tetap."""
+    h, w = image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return image
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+def encode_jpeg(image_rgb, quality=85):
+    """Meng-encode array RGB menjadi byte JPEG agar payload ke browser jauh lebih kecil."""
+    buf = io.BytesIO()
+    Image.fromarray(image_rgb).save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+def process_result(result):
+    """
+    Mengubah satu hasil YOLO menjadi gambar beranotasi (byte JPEG) dan daftar deteksi terurut.
+    Gambar di-encode sekali di sini sehingga cache dan session state menyimpan byte JPEG, bukan array.
+    """
+    # plot() menghasilkan BGR; view dengan stride terbalik menghindari salinan cvtColor
+    plotted_image = result.plot()[:, :, ::-1]
+    # Urutkan berdasarkan confidence (tertinggi dulu) di device, lalu pindahkan
+    # tensor kelas dan confidence ke CPU sekali per tensor, bukan per box
+    order = torch.argsort(result.boxes.conf, descending=True)
+    cls_arr = result.boxes.cls[order].cpu().numpy().astype(int)
+    conf_arr = result.boxes.conf[order].cpu().numpy()
+    detections = [
+        {'class': CLASS_NAMES[c] if c < len(CLASS_NAMES) else f"Unknown ({c})", 'confidence': float(cf)}
+        for c, cf in zip(cls_arr, conf_arr)
+    ]
+    return encode_jpeg(plotted_image), detections
+
+@st.cache_data(show_spinner=False)
+def precompute_examples(_model_entry, model_key, conf):
+    """
+    Menjalankan inferensi untuk semua gambar contoh dalam satu batch dan meng-cache hasilnya.
+    model_key (path dan mtime bobot) menggantikan objek model sebagai kunci cache.
+    """
+    example_images = load_example_images()
+    names = list(example_images)
+    if not names:
+        return {}
+    results = predict(_model_entry, [example_images[name]['full'] for name in names], conf)
+    return {name: process_result(result) for name, result in zip(names, results)}
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def run_inference(_model_entry, model_key, image_key, _image, conf):
+    """
+    Menjalankan inferensi satu gambar; dipanggil dari thread latar belakang.
+    _image berupa byte file upload atau array BGR frame video dan tidak di-hash; hasil di-cache
+    berdasarkan image_key (digest isi upload atau file_id video dan nomor frame), confidence,
+    dan model_key sehingga gambar yang sama tidak diinferensi ulang.
+    """
+    image = _image
+    if isinstance(image, bytes):
+        # Decode langsung ke array BGR yang diterima YOLO tanpa konversi PIL
+        image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Gagal membaca file gambar.")
+    image = bound_image(image)
+    return process_result(predict(_model_entry, image, conf)[0])
+
+def run_example_inference(model_entry, model_key, conf, name):
+    """Mengambil hasil satu gambar contoh dari batch yang di-cache; dipanggil dari thread latar belakang."""
+    return precompute_examples(model_entry, model_key, conf)[name]
+
+def get_executor():
+    """Mendapatkan executor satu worker milik sesi ini untuk menjalankan inferensi di latar belakang."""
+    if 'executor' not in st.session_state:
+        st.session_state.executor = ThreadPoolExecutor(max_workers=1)
+    return st.session_state.executor
 
 def get_prediction_style(class_name):
     """Mendapatkan kelas CSS berdasarkan nama kelas deteksi."""
-    return {'Glioma': 'glioma', 'Meningioma': 'meningioma', 'No Tumor': 'no-tumor', 'Pituitary': 'pituitary'}.get(class_name, 'no-tumor')
+    return _STYLE.get(class_name, 'no-tumor')
 
 def clear_results():
     """Membersihkan hasil deteksi sebelumnya dari session state."""
-    for key in ['result_image', 'detections', 'selected_image']:
+    for key in ['result_image', 'detections', 'selected_image', 'selected_image_key', 'selected_example',
+                'inference_future']:
         if key in st.session_state:
             del st.session_state[key]
 
@@ -132,9 +426,13 @@ def main():
     st.markdown('<h1 class="main-header">Brain Tumor Detection & Visualization</h1>', unsafe_allow_html=True)
 
     st.sidebar.header("⚙️ Model Configuration")
-    model_path = st.sidebar.text_input("Model Path", value="best.pt", help="Path ke file model YOLOv8 Anda (.pt)")
+    model_path = st.sidebar.text_input("Model Path", value="best.pt", help="Path ke file model YOLOv8 Anda (.pt, .onnx, atau .engine)")
     confidence_threshold = st.sidebar.slider("Confidence Threshold", 0.1, 1.0, 0.5, 0.05)
-    class_names = ['Glioma', 'Meningioma', 'No Tumor', 'Pituitary']
+    if '_yolo_model_key' in st.session_state:
+        st.sidebar.caption(f"Model aktif: {st.session_state['_yolo_model_key'][0]}")
+    export_errors = get_export_state()['errors']
+    if model_path in export_errors:
+        st.sidebar.warning(f"Export model gagal, tetap memakai {model_path}: {export_errors[model_path]}")
 
     st.sidebar.divider() 
     
@@ -161,11 +459,13 @@ def main():
         with tab1:
             uploaded_file = st.file_uploader("Choose a brain scan image...", type=['png', 'jpg', 'jpeg'])
             if uploaded_file:
-                image_to_process = Image.open(uploaded_file)
-                st.image(image_to_process, caption="Uploaded Image.")
+                # Preview mengirim byte asli tanpa decode; decode hanya terjadi di run_inference
+                st.image(uploaded_file, caption="Uploaded Image.")
                 if st.button("Analyze Uploaded Image", key="analyze_upload"):
                     clear_results()
-                    st.session_state.selected_image = image_to_process
+                    st.session_state.selected_image = uploaded_file.getvalue()
+                    # Digest isi file menjadi kunci cache inferensi
+                    st.session_state.selected_image_key = hashlib.sha256(st.session_state.selected_image).hexdigest()
 
         with tab2:
             st.write("Click on any sample button to use it for prediction:")
@@ -177,76 +477,97 @@ def main():
                     with col:
                         tumor_type = image_types[i]
                         if tumor_type in example_images:
-                            display_img = resize_for_display(example_images[tumor_type])
-                            st.image(display_img, caption=f"{tumor_type} Sample")
+                            st.image(example_images[tumor_type]['thumb'], caption=f"{tumor_type} Sample")
                             if st.button(f"Use {tumor_type}", key=f"btn_{tumor_type}"):
                                 clear_results()
-                                st.session_state.selected_image = example_images[tumor_type]
+                                st.session_state.selected_image = example_images[tumor_type]['full']
+                                st.session_state.selected_example = tumor_type
 
         with tab3:
             uploaded_video = st.file_uploader("Choose a brain scan video...", type=['mp4', 'mov', 'avi'])
             if uploaded_video:
-                _, total_frames, error = extract_frame_from_video(uploaded_video, 0)
+                cap, error = open_video(uploaded_video)
+                total_frames = get_total_frames(cap) if cap is not None else 0
                 
                 if error:
                     st.error(error)
                 elif total_frames > 0:
                     frame_number = st.slider("Select frame to analyze", 0, total_frames - 1, total_frames // 2)
                     
-                    image_to_process, _, _ = extract_frame_from_video(uploaded_video, frame_number)
+                    image_to_process, frame_error = get_frame(cap, frame_number)
                     
-                    if image_to_process:
-                        st.image(image_to_process, caption=f"Selected Frame: {frame_number}", use_column_width=True)
+                    if frame_error:
+                        st.error(frame_error)
+                    if image_to_process is not None:
+                        # View dengan stride terbalik (BGR -> RGB) tanpa cvtColor maupun salinan channels="BGR"
+                        st.image(image_to_process[:, :, ::-1], caption=f"Selected Frame: {frame_number}",
+                                 use_container_width=True)
                         if st.button("Analyze Video Frame", key="analyze_video"):
                             clear_results()
                             st.session_state.selected_image = image_to_process
+                            st.session_state.selected_image_key = (uploaded_video.file_id, frame_number)
                 else:
                     st.warning("Could not read frames from the uploaded video.")
+            elif 'video_file_id' in st.session_state:
+                # Video dihapus dari uploader: lepas VideoCapture dan file temporernya
+                release_video()
 
-    if 'selected_image' in st.session_state and 'result_image' not in st.session_state:
-        with st.spinner("Analyzing image... Please wait."):
-            model, model_error = load_model(model_path)
-            if model_error:
-                st.error(f"Failed to load model: {model_error}")
+    if 'selected_image' in st.session_state and 'result_image' not in st.session_state \
+            and 'inference_future' not in st.session_state:
+        with st.spinner("Loading model... Please wait."):
+            model_entry, model_error = get_model(model_path)
+        if model_error:
+            st.error(f"Failed to load model: {model_error}")
+        else:
+            executor = get_executor()
+            if 'selected_example' in st.session_state:
+                st.session_state.inference_future = executor.submit(
+                    run_example_inference, model_entry, st.session_state['_yolo_model_key'], confidence_threshold,
+                    st.session_state.selected_example)
             else:
-                results = model(st.session_state.selected_image, conf=confidence_threshold)
-                result = results[0]
-                plotted_image = cv2.cvtColor(result.plot(), cv2.COLOR_BGR2RGB)
-                st.session_state.result_image = plotted_image
-                
-                detections = []
-                for box in result.boxes:
-                    class_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    class_name = class_names[class_id] if class_id < len(class_names) else f"Unknown ({class_id})"
-                    detections.append({'class': class_name, 'confidence': confidence})
-                st.session_state.detections = detections
-                st.rerun()
+                st.session_state.inference_future = executor.submit(
+                    run_inference, model_entry, st.session_state['_yolo_model_key'], st.session_state.selected_image_key,
+                    st.session_state.selected_image, confidence_threshold)
+
+    future = st.session_state.get('inference_future')
+    if future is not None and future.done():
+        del st.session_state.inference_future
+        try:
+            st.session_state.result_image, st.session_state.detections = future.result()
+        except Exception as e:
+            st.error(f"Failed to analyze image: {e}")
+            del st.session_state.selected_image
+        future = None
 
     with col2:
         st.header("2. Detection Result")
         if 'result_image' in st.session_state:
-            st.image(st.session_state.result_image, caption="Image with Detections")
+            st.image(st.session_state.result_image, caption="Image with Detections", use_container_width=True)
             
             detections = st.session_state.get('detections', [])
             if detections:
                 st.success(f"Found {len(detections)} detection(s).")
-                detections_sorted = sorted(detections, key=lambda x: x['confidence'], reverse=True)
-                for detection in detections_sorted:
-                    style_class = get_prediction_style(detection['class'])
-                    st.markdown(f"""
-                    <div class="prediction-box {style_class}">
-                        <p><strong>Class:</strong> {detection['class']} | <strong>Confidence:</strong> {detection['confidence']:.2%}</p>
-                    </div>""", unsafe_allow_html=True)
+                for detection in detections:
+                    st.markdown(_CARD.substitute(style_class=get_prediction_style(detection['class']),
+                                                 class_name=detection['class'],
+                                                 confidence=f"{detection['confidence']:.2%}"),
+                                unsafe_allow_html=True)
                 if any(d['class'] != 'No Tumor' for d in detections):
                     st.info("Please consult with a medical professional for a proper diagnosis.")
             else:
                 st.info("No tumor was detected based on the current confidence threshold.")
+        elif future is not None:
+            st.info("⏳ Analyzing image... Please wait.")
         else:
             st.info("The analysis result will be displayed here.")
 
     st.markdown("---")
     st.markdown("**Disclaimer:** This tool is for educational purposes only and is not a substitute for professional medical diagnosis.")
 
+    if future is not None:
+        # Polling hasil inferensi: UI sudah dirender penuh, jalankan ulang script sebentar lagi
+        time.sleep(0.2)
+        st.rerun()
+
 if __name__ == "__main__":
     main()